@@ -4,42 +4,124 @@ PDF Editorial/Opinion Extractor with LLM + Keyword Fallback.
 
 - Labels every page: editorial / opinion / other
 - Merges editorial and opinion pages into a single consolidated PDF
+- Optional --batch mode submits all pages as one Gemini Batch API job
 """
 
 import os
+import re
 import sys
-import glob
 import json
+import hashlib
 import time
+import random
+import asyncio
+import argparse
+import tempfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from typing import Optional
-from pypdf import PdfReader, PdfWriter
+
+import llm_cache
+import prefilter
+from classify_core import keyword_label, label_from_entry, split_output
+
+try:
+    import fitz  # PyMuPDF
+    HAVE_FITZ = True
+except Exception:
+    fitz = None
+    HAVE_FITZ = False
+
+try:
+    import pypdfium2 as pdfium  # optional, faster on graphics-heavy pages
+    HAVE_PDFIUM = True
+except Exception:
+    pdfium = None
+    HAVE_PDFIUM = False
 
 # --- CONFIGURATION ---
 INPUT_DIR = "/mnt/c/Users/Juilee/Downloads/newspapers"
 OUTPUT_PDF = "Consolidated_Editorial_and_Opinion_Pages.pdf"
 MODEL_NAME = "gemini-2.5-flash"
 
-# LLM prompt
-PROMPT = """
-Analyze the following text from a newspaper page. Determine if the primary content belongs to the Opinion, Editorial, Letters to the Editor, or Op-Ed section.
-Respond ONLY with a single JSON object: {{"is_editorial": true, "reason": "brief explanation"}} 
-or {{"is_editorial": false, "reason": "brief explanation"}}.
+# LLM prompt (several numbered pages per request), joined around the page
+# text rather than formatted so the page text is copied only once
+PROMPT_HEAD = """
+Analyze each of the following numbered newspaper pages. For every page, determine if the primary content belongs to the Opinion, Editorial, Letters to the Editor, or Op-Ed section.
+Respond ONLY with a single JSON object containing one entry per page:
+{"labels": [{"id": 1, "is_editorial": true, "reason": "brief explanation"}, {"id": 2, "is_editorial": false, "reason": "brief explanation"}]}
 
-Text (truncated if long):
----
-{page_text}
----
+Pages (each truncated if long):
 """
+PROMPT_TAIL = "\n"
+PAGE_HEAD = "[{id}]\n---\n"
+PAGE_TAIL = "\n---\n"
+
+# Structured output schema matching PROMPT_HEAD; Gemini then always returns
+# this exact JSON shape
+RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "labels": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "id": {"type": "INTEGER"},
+                    "is_editorial": {"type": "BOOLEAN"},
+                    "reason": {"type": "STRING"},
+                },
+                "required": ["id", "is_editorial"],
+            },
+        },
+    },
+    "required": ["labels"],
+}
+
+# Pages longer than this are truncated before being sent to the LLM
+MAX_PAGE_CHARS = 8000
+
+# Up to PAGE_BATCH pages share one LLM request, capped at MAX_PROMPT_CHARS of page text
+PAGE_BATCH = 8
+MAX_PROMPT_CHARS = 30000
 
 # Pages with very little text will still be considered if keyword matches
 SPARSE_THRESHOLD = 40
 
-# Keyword fallback for editorial/opinion
-KEYWORDS = ["editorial", "op-ed", "opinion", "letter to the editor", "letters"]
+# Keyword hits skip the LLM unless LLM_CONFIRM=1, which sends them to the LLM
+# and drops them when it says they are not editorial (strict precision)
+LLM_CONFIRM = os.environ.get("LLM_CONFIRM") == "1"
+
+# Gemini service tier for synchronous calls: Flex (half price, looser latency)
+# by default; GEMINI_TIER=standard reverts to the standard tier for debugging
+GEMINI_TIER = os.environ.get("GEMINI_TIER", "flex")
+
+# Retry config for LLM (exponential backoff with jitter, capped); sized for
+# the wider Flex latency window. Client errors other than 408/429 are not retried.
+MAX_RETRIES = 5
+RETRY_BACKOFF = 2.0
+MAX_RETRY_WAIT = 30
 
-# Retry config for LLM
-MAX_RETRIES = 3
-RETRY_BACKOFF = 1.5
+# Circuit breaker: after BREAKER_FAILURES consecutive LLM failures within
+# BREAKER_WINDOW seconds, hold all calls for BREAKER_COOLDOWN seconds
+BREAKER_FAILURES = 5
+BREAKER_WINDOW = 60
+BREAKER_COOLDOWN = 30
+
+# Worker processes for PDF text extraction (CPU-bound, one PDF per task)
+EXTRACT_WORKERS = os.cpu_count()
+
+# Maximum in-flight LLM requests when classifying pages concurrently
+MAX_CONCURRENT_LLM_CALLS = 16
+
+# Batch API polling (batch jobs may take minutes to hours)
+BATCH_POLL_INTERVAL = 30
+BATCH_DONE_STATES = {
+    "JOB_STATE_SUCCEEDED",
+    "JOB_STATE_FAILED",
+    "JOB_STATE_CANCELLED",
+    "JOB_STATE_EXPIRED",
+}
 
 # --- LLM Client Initialization ---
 try:
@@ -49,116 +131,408 @@ except Exception:
     genai = None
     HAVE_GENAI = False
 
-def init_client():
+try:
+    import httpx
+    HAVE_HTTPX = True
+except Exception:
+    httpx = None
+    HAVE_HTTPX = False
+
+def check_client_env():
     if 'GEMINI_API_KEY' not in os.environ:
         print("FATAL: GEMINI_API_KEY not found in environment.")
         sys.exit(1)
     if not HAVE_GENAI:
         print("FATAL: google.genai package not available.")
         sys.exit(1)
-    return genai.Client(api_key=os.environ['GEMINI_API_KEY'])
+
+def init_client(http_client=None):
+    http_options = {"httpx_async_client": http_client} if http_client is not None else None
+    return genai.Client(api_key=os.environ['GEMINI_API_KEY'], http_options=http_options)
+
+def make_http_client():
+    # One pooled async client with enough keep-alive connections for every
+    # concurrent call; None leaves the SDK on its default client
+    if not HAVE_HTTPX:
+        return None
+    limits = httpx.Limits(
+        max_keepalive_connections=MAX_CONCURRENT_LLM_CALLS,
+        max_connections=MAX_CONCURRENT_LLM_CALLS * 2,
+    )
+    return httpx.AsyncClient(limits=limits)
+
+# --- Text extraction ---
+def iter_pdfs(directory):
+    """Return the sorted PDF paths in directory; one scandir pass, no extra stats."""
+    with os.scandir(directory) as it:
+        paths = [
+            e.path for e in it
+            if e.name.lower().endswith(".pdf") and not e.name.startswith(".") and e.is_file()
+        ]
+    return sorted(paths)
+
+# Newspaper layouts produce long runs of spaces/newlines that only waste tokens
+_WS_RE = re.compile(r"\s+")
+
+def normalize_text(text):
+    return _WS_RE.sub(" ", text or "").strip()
+
+def extract_pages(pdf_path):
+    """Return [(page_index, text), ...] for every page, using PyMuPDF."""
+    doc = fitz.open(pdf_path)
+    try:
+        # load_page parses one page at a time; nothing else is kept in memory
+        return [
+            (idx, normalize_text(doc.load_page(idx).get_text("text")))
+            for idx in range(doc.page_count)
+        ]
+    finally:
+        doc.close()
+
+def extract_pages_pdfium(pdf_path):
+    """Same as extract_pages, using PDFium's text-only page walker."""
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        pages = []
+        for idx in range(len(pdf)):
+            page = pdf[idx]
+            textpage = page.get_textpage()
+            try:
+                pages.append((idx, normalize_text(textpage.get_text_range())))
+            finally:
+                textpage.close()
+                page.close()
+        return pages
+    finally:
+        pdf.close()
+
+EXTRACTORS = {
+    "fitz": extract_pages,
+    "pdfium": extract_pages_pdfium,
+}
+
+# --- Circuit breaker shared by all concurrent LLM calls ---
+_breaker = {"failures": 0, "first_failure": 0.0, "open_until": 0.0}
+
+async def wait_for_breaker():
+    delay = _breaker["open_until"] - time.monotonic()
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+def record_llm_result(ok):
+    if ok:
+        _breaker["failures"] = 0
+        return
+    now = time.monotonic()
+    if _breaker["failures"] == 0 or now - _breaker["first_failure"] > BREAKER_WINDOW:
+        _breaker["failures"] = 0
+        _breaker["first_failure"] = now
+    _breaker["failures"] += 1
+    if _breaker["failures"] >= BREAKER_FAILURES:
+        _breaker["failures"] = 0
+        _breaker["open_until"] = now + BREAKER_COOLDOWN
+        print(f"[{BREAKER_FAILURES} consecutive LLM failures; pausing calls for {BREAKER_COOLDOWN}s]")
+
+def is_retryable(exc):
+    code = getattr(exc, "code", None)
+    if isinstance(code, int) and 400 <= code < 500:
+        return code in (408, 429)
+    # Local validation errors (bad config/schema) fail the same way every time
+    return not isinstance(exc, (TypeError, ValueError))
 
 # --- LLM API Call with retries ---
-def call_llm(client, prompt):
+async def call_llm_async(client, prompt):
+    config = {"response_mime_type": "application/json", "response_schema": RESPONSE_SCHEMA}
+    if GEMINI_TIER and GEMINI_TIER != "standard":
+        config["service_tier"] = GEMINI_TIER
     last_exc = None
     for attempt in range(1, MAX_RETRIES + 1):
+        await wait_for_breaker()
         try:
-            resp = client.models.generate_content(
+            resp = await client.aio.models.generate_content(
                 model=MODEL_NAME,
                 contents=prompt,
-                config={"response_mime_type": "application/json"}
+                config=config
             )
-            if hasattr(resp, "text"):
-                return resp.text
-            return str(resp)
+            record_llm_result(True)
+            # None when the response has no text part (e.g. blocked); the
+            # caller then falls back to keywords
+            return resp.text
         except Exception as e:
+            if not is_retryable(e):
+                print(f"[LLM request rejected, not retrying: {e!r}]")
+                return None
             last_exc = e
-            wait = RETRY_BACKOFF ** (attempt - 1)
+            record_llm_result(False)
+            if attempt == MAX_RETRIES:
+                break
+            # Jitter keeps concurrent retries from hitting the API in lockstep
+            wait = min(MAX_RETRY_WAIT, RETRY_BACKOFF ** (attempt - 1) * (0.5 + random.random()))
             print(f"[LLM attempt {attempt} failed: {e!r}. Retrying after {wait:.1f}s]")
-            time.sleep(wait)
+            await asyncio.sleep(wait)
     print(f"[LLM failed after {MAX_RETRIES} attempts: {last_exc!r}]")
     return None
 
-# --- Classify a page using LLM + keyword fallback ---
-def classify_page(client, page_text):
-    # Truncate very long pages
-    truncated = page_text[:10000]
-    prompt = PROMPT.format(page_text=truncated)
-
-    # Try LLM
-    result = None
-    raw_output = call_llm(client, prompt)
-    if raw_output:
-        raw_output = raw_output.strip()
+# --- Decide whether a page needs an LLM call at all ---
+def needs_llm(page_text):
+    if len(page_text.strip()) < SPARSE_THRESHOLD:
+        return False
+    return LLM_CONFIRM or keyword_label(page_text) == "other"
+
+def build_prompt(page_texts):
+    parts = [PROMPT_HEAD]
+    for n, text in enumerate(page_texts, start=1):
+        # Truncate very long pages (a no-copy slice when the page is short)
+        parts += (PAGE_HEAD.format(id=n), text[:MAX_PAGE_CHARS], PAGE_TAIL)
+    parts.append(PROMPT_TAIL)
+    return "".join(parts)
+
+def group_pages(page_texts):
+    """Split page indices into groups of at most PAGE_BATCH / MAX_PROMPT_CHARS."""
+    groups = []
+    current = []
+    current_chars = 0
+    for i, text in enumerate(page_texts):
+        size = min(len(text), MAX_PAGE_CHARS)
+        if current and (len(current) >= PAGE_BATCH or current_chars + size > MAX_PROMPT_CHARS):
+            groups.append(current)
+            current = []
+            current_chars = 0
+        current.append(i)
+        current_chars += size
+    if current:
+        groups.append(current)
+    return groups
+
+def page_digest(page_text):
+    # Identity of a page's text, for classifying repeated pages only once per run
+    return hashlib.sha1(page_text.encode("utf-8")).digest()
+
+def cache_key(page_text):
+    # (model, prompt template, truncated text) fully determines the LLM output
+    template = PROMPT_HEAD + PAGE_HEAD + PAGE_TAIL + PROMPT_TAIL
+    return llm_cache.make_key(MODEL_NAME, template, page_text[:MAX_PAGE_CHARS])
+
+# --- Label without the LLM: response cache, then local prefilter ---
+def local_label(page_text) -> Optional[str]:
+    cached = llm_cache.get(cache_key(page_text))
+    if cached is not None:
+        return label_from_entry(cached, page_text)
+    return prefilter.prefilter_label(page_text[:MAX_PAGE_CHARS])
+
+# --- Label a group of pages from one multi-page LLM response ---
+def labels_from_group_output(page_texts, raw_output):
+    labels = []
+    for text, entry in zip(page_texts, split_output(raw_output, len(page_texts))):
+        if entry is not None:
+            llm_cache.set(cache_key(text), entry)
+        labels.append(label_from_entry(entry, text))
+    return labels
+
+# --- Classify pages using LLM + keyword fallback, groups sent concurrently ---
+async def classify_pages_async(client, page_texts):
+    labels = [local_label(text) for text in page_texts]
+    todo = [i for i, label in enumerate(labels) if label is None]
+    sem = asyncio.Semaphore(MAX_CONCURRENT_LLM_CALLS)
+
+    async def classify_group(group):
+        texts = [page_texts[i] for i in group]
+        async with sem:
+            raw_output = await call_llm_async(client, build_prompt(texts))
+        for i, label in zip(group, labels_from_group_output(texts, raw_output)):
+            labels[i] = label
+
+    groups = group_pages([page_texts[i] for i in todo])
+    await asyncio.gather(*(classify_group([todo[j] for j in group]) for group in groups))
+    return labels
+
+async def classify_all_async(page_texts):
+    """Run classify_pages_async on a pooled HTTP client closed inside the same event loop."""
+    http_client = make_http_client()
+    try:
+        return await classify_pages_async(init_client(http_client), page_texts)
+    finally:
+        if http_client is not None:
+            await http_client.aclose()
+
+# --- Classify many pages with a single Gemini Batch API job ---
+def run_batch_job(client, prompts):
+    """
+    Submit {key: prompt} as one batch job and return {key: raw_output}.
+    Keys missing from the result (failed job or failed request) fall back
+    to keywords in the caller.
+    """
+    with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False, encoding="utf-8") as f:
+        for key, prompt in prompts.items():
+            f.write(json.dumps({
+                "key": key,
+                "request": {
+                    "contents": [{"parts": [{"text": prompt}]}],
+                    "generation_config": {
+                        "response_mime_type": "application/json",
+                        "response_schema": RESPONSE_SCHEMA,
+                    },
+                },
+            }) + "\n")
+        requests_path = f.name
+
+    try:
+        uploaded = client.files.upload(file=requests_path, config={"mime_type": "jsonl"})
+    finally:
+        os.remove(requests_path)
+
+    batch_job = client.batches.create(model=MODEL_NAME, src=uploaded.name)
+    print(f"Submitted batch job {batch_job.name} with {len(prompts)} requests")
+    while batch_job.state.name not in BATCH_DONE_STATES:
+        print(f"  [batch {batch_job.state.name}; checking again in {BATCH_POLL_INTERVAL}s]")
+        time.sleep(BATCH_POLL_INTERVAL)
+        batch_job = client.batches.get(name=batch_job.name)
+
+    if batch_job.state.name != "JOB_STATE_SUCCEEDED":
+        print(f"[Batch job ended in {batch_job.state.name}: {batch_job.error!r}]")
+        return {}
+
+    content = client.files.download(file=batch_job.dest.file_name)
+    outputs = {}
+    for line in content.decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
         try:
-            result = json.loads(raw_output)
-        except Exception:
-            # Attempt to extract JSON from response
-            start = raw_output.find("{")
-            end = raw_output.rfind("}")
-            if start != -1 and end != -1 and end > start:
-                try:
-                    result = json.loads(raw_output[start:end+1])
-                except Exception:
-                    result = None
-    # Determine label
-    label = "other"
-    if isinstance(result, dict) and result.get("is_editorial"):
-        label = "editorial"
-    else:
-        # Keyword fallback
-        page_lower = page_text.lower()
-        if any(kw in page_lower for kw in KEYWORDS):
-            label = "opinion"  # treat keyword match as opinion/editorial
-    return label
+            parts = item["response"]["candidates"][0]["content"]["parts"]
+            outputs[item["key"]] = "".join(p.get("text", "") for p in parts)
+        except (KeyError, IndexError, TypeError):
+            print(f"[Batch request {item.get('key')} failed: {item.get('error')!r}]")
+    return outputs
 
 # --- Main Pipeline ---
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--input", default=INPUT_DIR,
+                        help=f"directory of newspaper PDFs (default: {INPUT_DIR})")
+    parser.add_argument("--output", default=OUTPUT_PDF,
+                        help=f"consolidated PDF to write (default: {OUTPUT_PDF})")
+    parser.add_argument("--extractor", choices=sorted(EXTRACTORS), default="fitz",
+                        help="text extraction backend; pass 1 timing is printed for comparison")
+    parser.add_argument("--batch", action="store_true",
+                        help="classify all pages in one Gemini Batch API job (slower turnaround, half price)")
+    parser.add_argument("--no-prefilter", action="store_true",
+                        help=f"send every candidate page to the LLM even if {prefilter.MODEL_PATH} is present")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"ignore and do not update the LLM response cache in {llm_cache.CACHE_DIR}")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    llm_cache.ENABLED = not args.no_cache
+    prefilter.ENABLED = not args.no_prefilter
     print("--- Starting Editorial/Opinion Extraction ---")
-    client = init_client()
-    writer = PdfWriter()
+    check_client_env()
+    if not HAVE_FITZ:
+        print("FATAL: PyMuPDF (fitz) package not available.")
+        sys.exit(1)
+    if args.extractor == "pdfium" and not HAVE_PDFIUM:
+        print("FATAL: pypdfium2 package not available.")
+        sys.exit(1)
 
-    pdf_files = glob.glob(os.path.join(INPUT_DIR, "*.pdf"))
+    pdf_files = iter_pdfs(args.input)
     if not pdf_files:
-        print(f"No PDFs found under {INPUT_DIR}")
+        print(f"No PDFs found under {args.input}")
         sys.exit(1)
 
-    total_pages = 0
-    total_extracted = 0
+    # Pass 1: extract text from every PDF in parallel
+    extract = EXTRACTORS[args.extractor]
+    extracted = {}
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=EXTRACT_WORKERS) as pool:
+        futures = {pdf_path: pool.submit(extract, pdf_path) for pdf_path in pdf_files}
+        for pdf_path, future in futures.items():
+            try:
+                extracted[pdf_path] = future.result()
+            except Exception as e:
+                print(f"Cannot read PDF {pdf_path}: {e}")
+    print(f"Extracted text from {len(extracted)} PDFs with {args.extractor} in {time.perf_counter() - started:.2f}s")
 
-    for pdf_path in sorted(pdf_files):
-        print(f"\nProcessing {os.path.basename(pdf_path)}")
-        try:
-            reader = PdfReader(pdf_path)
-        except Exception as e:
-            print(f"Cannot read PDF {pdf_path}: {e}")
-            continue
+    # Identical pages (syndicated columns, shared masthead pages) are
+    # classified once and the label reused for every occurrence
+    seen = {}
+
+    if args.batch:
+        # Submit each unique page the cache and prefilter cannot label
+        pending = {}
+        for pages in extracted.values():
+            for idx, text in pages:
+                if not needs_llm(text):
+                    continue
+                digest = page_digest(text)
+                if digest in seen or digest in pending:
+                    continue
+                label = local_label(text)
+                if label is not None:
+                    seen[digest] = label
+                else:
+                    pending[digest] = text
+        if pending:
+            digests = list(pending)
+            groups = [[digests[i] for i in group] for group in group_pages(list(pending.values()))]
+            prompts = {
+                str(n): build_prompt([pending[d] for d in group])
+                for n, group in enumerate(groups)
+            }
+            batch_outputs = run_batch_job(init_client(), prompts)
+            for n, group in enumerate(groups):
+                labels = labels_from_group_output([pending[d] for d in group], batch_outputs.get(str(n)))
+                seen.update(zip(group, labels))
 
-        for idx, page in enumerate(reader.pages):
-            text = page.extract_text() or ""
-            if len(text.strip()) < SPARSE_THRESHOLD:
-                # Still run keyword fallback even for sparse pages
-                page_label = "other"
-                page_lower = text.lower()
-                if any(kw in page_lower for kw in KEYWORDS):
-                    page_label = "opinion"
+    else:
+        # Gather each unique page needing the LLM across every PDF, so one
+        # event loop (and one pooled HTTP session) serves the whole run
+        pending = {}
+        for pages in extracted.values():
+            for idx, text in pages:
+                if needs_llm(text):
+                    pending.setdefault(page_digest(text), text)
+        if pending:
+            labels = asyncio.run(classify_all_async(list(pending.values())))
+            seen.update(zip(pending, labels))
+
+    # Label every page
+    total_pages = 0
+    hits_by_pdf = defaultdict(list)
+    for pdf_path, pages in extracted.items():
+        print(f"\nProcessing {os.path.basename(pdf_path)}")
+        for idx, text in pages:
+            if needs_llm(text):
+                page_label = seen[page_digest(text)]
             else:
-                page_label = classify_page(client, text)
+                # Sparse or keyword-matched pages are labeled by keywords alone
+                page_label = keyword_label(text)
 
             print(f"  -> Page {idx + 1}: {page_label}")
 
             if page_label in ["editorial", "opinion"]:
-                writer.add_page(page)
-                total_extracted += 1
+                hits_by_pdf[pdf_path].append(idx)
             total_pages += 1
 
-    # Save consolidated PDF
-    if len(writer.pages) > 0:
-        with open(OUTPUT_PDF, "wb") as f:
-            writer.write(f)
-        print(f"\nSUCCESS: Extracted {len(writer.pages)} pages into {OUTPUT_PDF}")
-    else:
+    # Pass 2: copy hits with PyMuPDF, one source PDF open at a time
+    if not hits_by_pdf:
         print("\nNo editorial/opinion pages found.")
+        return
+
+    out = fitz.open()
+    for pdf_path, indices in hits_by_pdf.items():
+        src = fitz.open(pdf_path)
+        try:
+            for idx in indices:
+                out.insert_pdf(src, from_page=idx, to_page=idx)
+        finally:
+            src.close()
+
+    # Save consolidated PDF (garbage=4 drops duplicate objects, deflate compresses streams)
+    page_count = out.page_count
+    out.save(args.output, garbage=4, deflate=True)
+    out.close()
+    print(f"\nSUCCESS: Extracted {page_count} pages into {args.output}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Per-page string hot paths for classifier.py: keyword scan and LLM output parsing.
+
+- Pure functions with strict annotations, no I/O
+- Runs as plain Python, or compile for speed with: python -m mypyc classify_core.py
+"""
+
+import re
+import json
+from typing import Any, Dict, List, Optional
+
+# Keyword fallback for editorial/opinion
+KEYWORDS: List[str] = ["editorial", "op-ed", "opinion", "letter to the editor", "letters"]
+
+# Section keywords sit in headers/mastheads, so only the top of the page is scanned
+KEYWORD_SCAN_CHARS: int = 2000
+
+# Case-insensitive single pass over the page, no lowercased copy needed
+_KW_RE = re.compile("|".join(map(re.escape, KEYWORDS)), re.IGNORECASE)
+
+# --- Parse LLM output into JSON (or None) ---
+def parse_llm_output(raw_output: Optional[str]) -> Any:
+    if not raw_output:
+        return None
+    raw_output = raw_output.strip()
+    try:
+        return json.loads(raw_output)
+    except Exception:
+        # Attempt to extract JSON from response
+        start = raw_output.find("{")
+        end = raw_output.rfind("}")
+        if start != -1 and end != -1 and end > start:
+            try:
+                return json.loads(raw_output[start:end+1])
+            except Exception:
+                return None
+    return None
+
+# --- Keyword fallback ---
+def keyword_label(page_text: str) -> str:
+    if _KW_RE.search(page_text, 0, KEYWORD_SCAN_CHARS):
+        return "opinion"  # treat keyword match as opinion/editorial
+    return "other"
+
+# --- Determine label from a page's parsed LLM entry, falling back to keywords ---
+def label_from_entry(entry: Any, page_text: str) -> str:
+    # An LLM verdict is final (so LLM_CONFIRM can veto keyword hits);
+    # keywords only decide when there is no verdict
+    if isinstance(entry, dict) and isinstance(entry.get("is_editorial"), bool):
+        return "editorial" if entry["is_editorial"] else "other"
+    return keyword_label(page_text)
+
+# --- Split a multi-page response into one parsed entry (or None) per page ---
+def split_output(raw_output: Optional[str], count: int) -> List[Optional[Dict[str, Any]]]:
+    result = parse_llm_output(raw_output)
+    entries = result.get("labels") if isinstance(result, dict) else result
+    outputs: List[Optional[Dict[str, Any]]] = [None] * count
+    if not isinstance(entries, list):
+        return outputs
+    for pos, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            continue
+        page_id = entry.get("id", pos + 1)
+        if isinstance(page_id, int) and 1 <= page_id <= count:
+            outputs[page_id - 1] = entry
+    return outputs
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+On-disk cache for parsed per-page LLM responses (any JSON value).
+
+- Entries live at data/llm_cache/<key[:2]>/<key>.json
+- Keys are SHA-256 digests over length-prefixed parts (model, prompt, text)
+- Set ENABLED = False to bypass the cache entirely
+"""
+
+import os
+import json
+import hashlib
+from typing import Any
+
+CACHE_DIR = os.path.join("data", "llm_cache")
+ENABLED = True
+
+def make_key(*parts):
+    # 8-byte length prefix per part so ("ab", "c") and ("a", "bc") never collide
+    h = hashlib.sha256()
+    for part in parts:
+        data = part.encode("utf-8")
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+def _path(key):
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.json")
+
+def get(key) -> Any:
+    if not ENABLED:
+        return None
+    try:
+        with open(_path(key), encoding="utf-8") as f:
+            return json.load(f)["output"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+def set(key, value):
+    if not ENABLED:
+        return
+    path = _path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write then rename so a crashed run never leaves a half-written entry
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"output": value}, f)
+    os.replace(tmp_path, path)
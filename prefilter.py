@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Local page prefilter for classifier.py (TF-IDF + logistic regression).
+
+- `python prefilter.py` trains on the PDFs in classifier.INPUT_DIR and writes prefilter.pkl
+- Trains only on pages that would reach the prefilter (classifier.needs_llm), labeled
+  by cached LLM verdicts; run classifier.py with --no-prefilter first to collect them
+- At classification time, confident predictions skip the LLM call
+"""
+
+import os
+import sys
+import pickle
+from typing import Optional
+
+try:
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+    HAVE_SKLEARN = True
+except Exception:
+    HAVE_SKLEARN = False
+
+MODEL_PATH = "prefilter.pkl"
+
+# Below / above these editorial probabilities the LLM is skipped
+NEGATIVE_THRESHOLD = 0.05
+POSITIVE_THRESHOLD = 0.95
+
+# Minimum cached LLM verdicts of each class before a model is trained
+MIN_CLASS_PAGES = 20
+
+ENABLED = True
+
+_model = None
+_model_loaded = False
+
+def get_model():
+    """Load prefilter.pkl once; None if sklearn or the model file is missing."""
+    global _model, _model_loaded
+    if not _model_loaded:
+        _model_loaded = True
+        if HAVE_SKLEARN and os.path.exists(MODEL_PATH):
+            with open(MODEL_PATH, "rb") as f:
+                _model = pickle.load(f)
+    return _model
+
+def prefilter_label(page_text) -> Optional[str]:
+    """Return "other" / "opinion" for confident pages, None when the LLM should decide."""
+    if not ENABLED:
+        return None
+    model = get_model()
+    if model is None:
+        return None
+    p = model.predict_proba([page_text])[0, 1]
+    if p < NEGATIVE_THRESHOLD:
+        return "other"
+    if p > POSITIVE_THRESHOLD:
+        return "opinion"
+    return None
+
+def train(texts, labels):
+    model = make_pipeline(
+        TfidfVectorizer(max_features=5000, ngram_range=(1, 2), sublinear_tf=True),
+        LogisticRegression(max_iter=1000, class_weight="balanced"),
+    )
+    model.fit(texts, labels)
+    return model
+
+# --- Training entry point ---
+def main():
+    if not HAVE_SKLEARN:
+        print("FATAL: scikit-learn package not available.")
+        sys.exit(1)
+
+    import classifier
+    import llm_cache
+
+    pdf_files = classifier.iter_pdfs(classifier.INPUT_DIR)
+    if not pdf_files:
+        print(f"No PDFs found under {classifier.INPUT_DIR}")
+        sys.exit(1)
+
+    # Keyword-positive pages never reach the prefilter, and keyword labels
+    # would only teach it to find keywords, so only cached LLM verdicts count
+    texts = []
+    labels = []
+    seen = set()
+    uncached = 0
+    for pdf_path in pdf_files:
+        try:
+            pages = classifier.extract_pages(pdf_path)
+        except Exception as e:
+            print(f"Cannot read PDF {pdf_path}: {e}")
+            continue
+        for _, text in pages:
+            if not classifier.needs_llm(text):
+                continue
+            digest = classifier.page_digest(text)
+            if digest in seen:
+                continue
+            seen.add(digest)
+            entry = llm_cache.get(classifier.cache_key(text))
+            if not isinstance(entry, dict) or not isinstance(entry.get("is_editorial"), bool):
+                uncached += 1
+                continue
+            texts.append(text[:classifier.MAX_PAGE_CHARS])
+            labels.append(int(entry["is_editorial"]))
+
+    positives = sum(labels)
+    if min(positives, len(labels) - positives) < MIN_CLASS_PAGES:
+        print(f"Need at least {MIN_CLASS_PAGES} cached LLM verdicts of each class to train the prefilter "
+              f"(have {positives} editorial, {len(labels) - positives} other; {uncached} candidate pages uncached).")
+        print("Run classifier.py --no-prefilter over more PDFs first.")
+        sys.exit(1)
+
+    model = train(texts, labels)
+    with open(MODEL_PATH, "wb") as f:
+        pickle.dump(model, f)
+    print(f"Trained on {len(texts)} LLM-labeled pages ({positives} editorial) -> {MODEL_PATH}")
+
+if __name__ == "__main__":
+    main()
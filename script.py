@@ -9,9 +9,9 @@ PDF Editorial Extractor
 
 import os
 import sys
-import glob
 import json
-from pypdf import PdfReader, PdfWriter
+import re
+from pypdf import PdfWriter
 import fitz  # PyMuPDF
 from google import genai
 
@@ -34,6 +34,13 @@ Text:
 ---
 """
 
+# Pages whose header already names the section skip the LLM unless LLM_CONFIRM=1
+# (same list as classify_core.KEYWORDS in classifier.py)
+KEYWORDS = ["editorial", "op-ed", "opinion", "letter to the editor", "letters"]
+KEYWORD_SCAN_CHARS = 2000
+LLM_CONFIRM = os.getenv("LLM_CONFIRM") == "1"
+_KW_RE = re.compile("|".join(map(re.escape, KEYWORDS)), re.IGNORECASE)
+
 # --- FUNCTIONS ---
 
 def init_client():
@@ -55,6 +62,15 @@ def init_client():
     sys.exit(1)
 
 
+def iter_pdfs(directory):
+    """Return the sorted PDF paths in directory; one scandir pass, no extra stats."""
+    with os.scandir(directory) as it:
+        paths = [
+            e.path for e in it
+            if e.name.lower().endswith(".pdf") and not e.name.startswith(".") and e.is_file()
+        ]
+    return sorted(paths)
+
 def extract_text(pdf_path):
     pages = []
     doc = fitz.open(pdf_path)
@@ -80,7 +96,10 @@ def classify(client, text) -> bool:
         config={"response_mime_type": "application/json"}
     )
 
-    raw = getattr(resp, "text", None) or str(resp)
+    # No text part (e.g. blocked response): not editorial
+    raw = resp.text
+    if not raw:
+        return False
     raw = raw.strip()
 
     # Try to parse JSON directly, else extract first {...} substring and parse
@@ -104,29 +123,44 @@ def classify(client, text) -> bool:
 def main():
     print("Starting Editorial Extraction...")
     client = init_client()
-    writer = PdfWriter()
 
-    pdfs = glob.glob(os.path.join(INPUT_DIR, "*.pdf"))
+    pdfs = iter_pdfs(INPUT_DIR)
     if not pdfs:
         print("No PDFs found in", INPUT_DIR)
         sys.exit(1)
 
     total = 0
-    for pdf in sorted(pdfs):
+    hits_by_pdf = {}
+    for pdf in pdfs:
         print(f"\nProcessing {os.path.basename(pdf)}...")
-        reader = PdfReader(pdf)
         pages = extract_text(pdf)
+        hits = []
 
         for p in pages:
             text = p["text"].strip()
             if len(text) < 100:  # skip empty/ads
                 continue
-            if classify(client, text):
-                print(f"  -> Page {p['index']+1}: Editorial")
-                writer.add_page(reader.pages[p["index"]])
-                total += 1
+            if not LLM_CONFIRM and _KW_RE.search(text, 0, KEYWORD_SCAN_CHARS):
+                source = "keyword"
+            elif classify(client, text):
+                source = "LLM"
+            else:
+                continue
+            print(f"  -> Page {p['index']+1}: Editorial ({source})")
+            hits.append(p["index"])
+        if hits:
+            hits_by_pdf[pdf] = hits
+            total += len(hits)
 
     if total:
+        # append() copies each source's pages together so shared fonts and
+        # resources are imported once per file, not once per page
+        writer = PdfWriter()
+        for pdf, hits in hits_by_pdf.items():
+            writer.append(pdf, pages=hits)
+        if hasattr(writer, "compress_identical_objects"):
+            # Dedupe identical objects (e.g. fonts) across editions; pypdf >= 4.3
+            writer.compress_identical_objects()
         with open(OUTPUT_PDF, "wb") as f:
             writer.write(f)
         print(f"\nSUCCESS: Extracted {total} editorial pages into {OUTPUT_PDF}")